@@ -5,33 +5,129 @@ Demonstrates searching, discovering, and getting installation info for servers.
 """
 
 import requests
+import functools
 import json
-from typing import Optional, List, Dict, Any
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    orjson = None
+
+_HR = "=" * 70
+_OFFICIAL_META = "io.modelcontextprotocol.registry/official"
+
+# Strings made only of unreserved URL characters need no percent-encoding
+_UNRESERVED_RE = re.compile(r"[A-Za-z0-9._~-]+")
+
+
+def _loads(data: bytes) -> Any:
+    """Decode a JSON response body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@functools.lru_cache(maxsize=256)
+def _quote(value: str) -> str:
+    """Percent-encode a URL path segment (including '/')."""
+    if _UNRESERVED_RE.fullmatch(value):
+        return value
+    return quote(value, safe='')
+
+
+def _write(lines: List[str]):
+    """Write a block of output lines to stdout in a single call."""
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 class MCPRegistryClient:
     """Client for interacting with an MCP registry."""
     
-    def __init__(self, registry_url: str = "http://localhost:8080"):
+    # Maximum number of list_servers responses kept in the cache
+    LIST_CACHE_SIZE = 128
+    
+    def __init__(self, registry_url: str = "http://localhost:8080", cache_ttl: float = 15.0):
         self.registry_url = registry_url.rstrip('/')
         self.api_base = f"{self.registry_url}/v0.1"
+        self._servers_url = f"{self.api_base}/servers"
+        
+        # Short-lived cache of list_servers responses, keyed by query params
+        self.cache_ttl = cache_ttl
+        self._list_cache: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+        self._list_cache_lock = threading.Lock()
+        
+        # Reuse one session so keep-alive connections are pooled across calls
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.25, status_forcelist=[502, 503, 504]),
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+    
+    def close(self):
+        """Close the underlying HTTP session and its pooled connections."""
+        self._session.close()
+    
+    def __enter__(self) -> "MCPRegistryClient":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def health(self):
+        """
+        Check that the registry is reachable via its /health endpoint.
+        
+        Raises:
+            requests.exceptions.RequestException: If the registry is down
+        """
+        response = self._session.head(f"{self.registry_url}/health", timeout=2)
+        if response.status_code == 405:
+            # HEAD not routed for this endpoint; fall back to GET
+            response = self._session.get(f"{self.registry_url}/health", timeout=2)
+        response.raise_for_status()
+    
+    def invalidate(self):
+        """Drop all cached list_servers responses (e.g. after publishing)."""
+        with self._list_cache_lock:
+            self._list_cache.clear()
     
     def list_servers(
         self, 
         search: Optional[str] = None,
         version: str = "latest",
         limit: int = 30,
-        cursor: Optional[str] = None
+        cursor: Optional[str] = None,
+        force_refresh: bool = False
     ) -> Dict[str, Any]:
         """
         List servers from the registry.
         
+        Identical queries made within ``cache_ttl`` seconds are answered
+        from a local cache; callers should treat the returned data as
+        read-only.
+        
         Args:
             search: Search term to filter servers (substring match on name)
             version: Filter by version ('latest' or specific version)
             limit: Number of results per page (1-100)
             cursor: Pagination cursor for next page
+            force_refresh: Bypass the cache and always query the registry
             
         Returns:
             Response with servers list and pagination info
@@ -45,9 +141,69 @@ class MCPRegistryClient:
         if cursor:
             params["cursor"] = cursor
         
-        response = requests.get(f"{self.api_base}/servers", params=params)
+        key = tuple(sorted(params.items()))
+        now = time.monotonic()
+        if not force_refresh:
+            with self._list_cache_lock:
+                cached = self._list_cache.get(key)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+        
+        response = self._session.get(self._servers_url, params=params)
         response.raise_for_status()
-        return response.json()
+        result = _loads(response.content)
+        
+        if self.cache_ttl > 0:
+            with self._list_cache_lock:
+                self._list_cache.pop(key, None)
+                if len(self._list_cache) >= self.LIST_CACHE_SIZE:
+                    # Evict the oldest entry (dicts preserve insertion order)
+                    self._list_cache.pop(next(iter(self._list_cache)), None)
+                self._list_cache[key] = (now + self.cache_ttl, result)
+        return result
+    
+    def iter_pages(
+        self,
+        search: Optional[str] = None,
+        version: str = "latest",
+        limit: int = 30
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over every page of servers, following pagination cursors.
+        
+        Cursors are only known once the previous page has been parsed, so
+        pages cannot be fetched in parallel. Instead, the request for the
+        next page is issued in the background as soon as its cursor is
+        known, overlapping the round trip with the caller's work on the
+        current page.
+        
+        At most two pages are held in memory: the one being consumed and
+        the one being prefetched. Pages are decoded whole, because the next
+        cursor is only in the response metadata and streaming the servers
+        array would delay the prefetch.
+        
+        Args:
+            search: Search term to filter servers (substring match on name)
+            version: Filter by version ('latest' or specific version)
+            limit: Number of results per page (1-100)
+            
+        Yields:
+            One list_servers response per page
+        """
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            future = prefetcher.submit(
+                self.list_servers, search=search, version=version, limit=limit
+            )
+            while future is not None:
+                result = future.result()
+                cursor = result.get("metadata", {}).get('nextCursor')
+                future = None
+                if cursor:
+                    future = prefetcher.submit(
+                        self.list_servers, search=search, version=version,
+                        limit=limit, cursor=cursor
+                    )
+                yield result
     
     def get_server(self, server_name: str) -> Dict[str, Any]:
         """
@@ -73,13 +229,11 @@ class MCPRegistryClient:
         Returns:
             Server details for that version
         """
-        encoded_name = quote(server_name, safe='')
-        encoded_version = quote(version, safe='')
-        response = requests.get(
-            f"{self.api_base}/servers/{encoded_name}/versions/{encoded_version}"
+        response = self._session.get(
+            f"{self._servers_url}/{_quote(server_name)}/versions/{_quote(version)}"
         )
         response.raise_for_status()
-        return response.json()
+        return _loads(response.content)
     
     def list_server_versions(self, server_name: str) -> Dict[str, Any]:
         """
@@ -91,146 +245,161 @@ class MCPRegistryClient:
         Returns:
             List of all versions
         """
-        encoded_name = quote(server_name, safe='')
-        response = requests.get(f"{self.api_base}/servers/{encoded_name}/versions")
+        response = self._session.get(f"{self._servers_url}/{_quote(server_name)}/versions")
         response.raise_for_status()
-        return response.json()
+        return _loads(response.content)
 
 
-def print_server_info(server_data: Dict[str, Any], detailed: bool = False):
-    """Pretty print server information."""
-    server = server_data.get('server', {})
-    meta = server_data.get('_meta', {}).get('io.modelcontextprotocol.registry/official', {})
+def print_server_info(
+    server_data: Dict[str, Any],
+    detailed: bool = False,
+    out: Optional[List[str]] = None
+):
+    """
+    Pretty print server information.
+    
+    Lines are appended to ``out`` when given, so callers can emit a whole
+    block with a single write; otherwise they are written immediately.
+    """
+    buffered = out is not None
+    if not buffered:
+        out = []
     
-    print(f"\n{'='*70}")
-    print(f"📦 {server.get('title', 'N/A')}")
-    print(f"{'='*70}")
-    print(f"Name:        {server.get('name', 'N/A')}")
-    print(f"Version:     {server.get('version', 'N/A')}")
-    print(f"Description: {server.get('description', 'N/A')}")
+    server = server_data.get('server') or {}
+    meta = (server_data.get('_meta') or {}).get(_OFFICIAL_META) or {}
+    get = server.get
     
-    if repo := server.get('repository'):
-        print(f"Repository:  {repo.get('url', 'N/A')}")
+    out.append("\n" + _HR)
+    out.append(f"📦 {get('title', 'N/A')}")
+    out.append(_HR)
+    out.append(f"Name:        {get('name', 'N/A')}")
+    out.append(f"Version:     {get('version', 'N/A')}")
+    out.append(f"Description: {get('description', 'N/A')}")
+    
+    if repo := get('repository'):
+        out.append(f"Repository:  {repo.get('url', 'N/A')}")
     
     if meta:
-        print(f"\nStatus:      {meta.get('status', 'N/A')}")
-        print(f"Published:   {meta.get('publishedAt', 'N/A')}")
+        out.append(f"\nStatus:      {meta.get('status', 'N/A')}")
+        out.append(f"Published:   {meta.get('publishedAt', 'N/A')}")
         if meta.get('isLatest'):
-            print(f"Latest:      ✓ This is the latest version")
+            out.append(f"Latest:      ✓ This is the latest version")
     
-    if detailed and (packages := server.get('packages')):
-        print(f"\n📦 Installation Packages:")
+    if detailed and (packages := get('packages')):
+        out.append(f"\n📦 Installation Packages:")
         for pkg in packages:
-            print(f"   Type:     {pkg.get('type', 'N/A')}")
-            print(f"   Name:     {pkg.get('name', 'N/A')}")
+            out.append(f"   Type:     {pkg.get('type', 'N/A')}")
+            out.append(f"   Name:     {pkg.get('name', 'N/A')}")
             if install_cmd := pkg.get('installCommand'):
-                print(f"   Install:  {install_cmd}")
+                out.append(f"   Install:  {install_cmd}")
             if run_cmd := pkg.get('runCommand'):
-                print(f"   Run:      {run_cmd}")
-            print()
+                out.append(f"   Run:      {run_cmd}")
+            out.append("")
+    
+    if not buffered:
+        _write(out)
 
 
-def example_1_search_servers(client: MCPRegistryClient):
+def _format_server(server_data: Dict[str, Any], show_title: bool = False) -> str:
+    """Format one server entry of a listing as a bullet line."""
+    server = server_data.get('server') or {}
+    line = f"  • {server.get('name')} v{server.get('version')}"
+    if show_title:
+        line += f" - {server.get('title')}"
+    return line
+
+
+def example_1_search_servers(client: MCPRegistryClient, out: List[str]):
     """Example 1: Search for servers in the registry."""
-    print("\n" + "="*70)
-    print("EXAMPLE 1: Search for Math Servers")
-    print("="*70)
+    out.append("\n" + _HR)
+    out.append("EXAMPLE 1: Search for Math Servers")
+    out.append(_HR)
     
     # Search for servers containing "math" in their name
     result = client.list_servers(search="math", limit=10)
     
     servers = result.get('servers', [])
-    print(f"\nFound {len(servers)} server(s) matching 'math':")
+    out.append(f"\nFound {len(servers)} server(s) matching 'math':")
     
-    for server_data in servers:
-        server = server_data.get('server', {})
-        print(f"  • {server.get('name')} v{server.get('version')} - {server.get('title')}")
+    out.extend(_format_server(server_data, show_title=True) for server_data in servers)
 
 
-def example_2_get_specific_server(client: MCPRegistryClient, server_name: str):
+def example_2_get_specific_server(client: MCPRegistryClient, server_name: str, out: List[str]):
     """Example 2: Get details for a specific server."""
-    print("\n" + "="*70)
-    print(f"EXAMPLE 2: Get Server Details")
-    print("="*70)
+    out.append("\n" + _HR)
+    out.append(f"EXAMPLE 2: Get Server Details")
+    out.append(_HR)
     
     try:
         server_data = client.get_server(server_name)
-        print_server_info(server_data, detailed=True)
+        print_server_info(server_data, detailed=True, out=out)
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
-            print(f"\n❌ Server '{server_name}' not found in registry")
+            out.append(f"\n❌ Server '{server_name}' not found in registry")
         else:
             raise
 
 
-def example_3_list_versions(client: MCPRegistryClient, server_name: str):
+def _format_version(version_data: Dict[str, Any]) -> str:
+    """Format one entry of a versions listing as a bullet line."""
+    version_info = version_data.get('version') or {}
+    meta = (version_data.get('_meta') or {}).get(_OFFICIAL_META) or {}
+    
+    version_str = version_info.get('version', 'unknown')
+    published = meta.get('publishedAt', 'N/A')
+    latest = " (LATEST)" if meta.get('isLatest') else ""
+    
+    return f"  • v{version_str}{latest} - published {published}"
+
+
+def example_3_list_versions(client: MCPRegistryClient, server_name: str, out: List[str]):
     """Example 3: List all versions of a server."""
-    print("\n" + "="*70)
-    print(f"EXAMPLE 3: List All Versions")
-    print("="*70)
+    out.append("\n" + _HR)
+    out.append(f"EXAMPLE 3: List All Versions")
+    out.append(_HR)
     
     try:
         result = client.list_server_versions(server_name)
         versions = result.get('versions', [])
         
-        print(f"\nAvailable versions of {server_name}:")
-        for version_data in versions:
-            version_info = version_data.get('version', {})
-            meta = version_data.get('_meta', {}).get('io.modelcontextprotocol.registry/official', {})
-            
-            version_str = version_info.get('version', 'unknown')
-            published = meta.get('publishedAt', 'N/A')
-            latest = " (LATEST)" if meta.get('isLatest') else ""
-            
-            print(f"  • v{version_str}{latest} - published {published}")
+        out.append(f"\nAvailable versions of {server_name}:")
+        out.extend(_format_version(version_data) for version_data in versions)
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
-            print(f"\n❌ Server '{server_name}' not found")
+            out.append(f"\n❌ Server '{server_name}' not found")
         else:
             raise
 
 
-def example_4_list_all_servers(client: MCPRegistryClient):
+def example_4_list_all_servers(client: MCPRegistryClient, out: List[str]):
     """Example 4: List all servers with pagination."""
-    print("\n" + "="*70)
-    print("EXAMPLE 4: List All Servers (with pagination)")
-    print("="*70)
-    
-    all_servers = []
-    cursor = None
-    page = 1
+    out.append("\n" + _HR)
+    out.append("EXAMPLE 4: List All Servers (with pagination)")
+    out.append(_HR)
     
-    while True:
-        result = client.list_servers(limit=10, cursor=cursor)
+    total = 0
+    for page, result in enumerate(client.iter_pages(limit=10), start=1):
         servers = result.get('servers', [])
-        all_servers.extend(servers)
-        
-        print(f"\nPage {page}: Found {len(servers)} servers")
+        total += len(servers)
         
-        cursor = result.get("metadata", {}).get('nextCursor')
-        if not cursor:
-            break
-        page += 1
+        out.append(f"\nPage {page}: Found {len(servers)} servers")
+        out.extend(_format_server(server_data) for server_data in servers)
     
-    print(f"\n✓ Total servers in registry: {len(all_servers)}")
-    print("\nServers:")
-    for server_data in all_servers:
-        server = server_data.get('server', {})
-        print(f"  • {server.get('name')} v{server.get('version')}")
+    out.append(f"\n✓ Total servers in registry: {total}")
 
 
-def example_5_installation_info(client: MCPRegistryClient, server_name: str):
+def example_5_installation_info(client: MCPRegistryClient, server_name: str, out: List[str]):
     """Example 5: Get installation information."""
-    print("\n" + "="*70)
-    print("EXAMPLE 5: How to Use This Server")
-    print("="*70)
+    out.append("\n" + _HR)
+    out.append("EXAMPLE 5: How to Use This Server")
+    out.append(_HR)
     
     try:
         server_data = client.get_server(server_name)
-        server = server_data.get('server', {})
+        server = server_data.get('server') or {}
         
-        print(f"\n📖 Installation Guide for {server.get('title', server_name)}")
-        print("\nOption 1: Direct Installation")
+        out.append(f"\n📖 Installation Guide for {server.get('title', server_name)}")
+        out.append("\nOption 1: Direct Installation")
         
         packages = server.get('packages', [])
         if packages:
@@ -239,21 +408,21 @@ def example_5_installation_info(client: MCPRegistryClient, server_name: str):
                 pkg_name = pkg.get('name')
                 
                 if pkg_type == 'npm':
-                    print(f"  npm install -g {pkg_name}")
+                    out.append(f"  npm install -g {pkg_name}")
                 elif pkg_type == 'pypi':
-                    print(f"  pip install {pkg_name}")
+                    out.append(f"  pip install {pkg_name}")
                 elif pkg_type == 'docker':
-                    print(f"  docker pull {pkg_name}")
+                    out.append(f"  docker pull {pkg_name}")
                 
                 if run_cmd := pkg.get('runCommand'):
-                    print(f"  {run_cmd}")
+                    out.append(f"  {run_cmd}")
         else:
-            print("  No pre-packaged installation available.")
+            out.append("  No pre-packaged installation available.")
             if repo := server.get('repository'):
-                print(f"  Clone and build from source: {repo.get('url')}")
+                out.append(f"  Clone and build from source: {repo.get('url')}")
         
-        print("\nOption 2: Use with MCP Client (e.g., Claude Desktop)")
-        print("  Add to your MCP client config:")
+        out.append("\nOption 2: Use with MCP Client (e.g., Claude Desktop)")
+        out.append("  Add to your MCP client config:")
         
         # Get command from first package if available
         command = "path-to-server"
@@ -261,7 +430,7 @@ def example_5_installation_info(client: MCPRegistryClient, server_name: str):
             first_pkg = packages[0]
             command = first_pkg.get('runCommand', 'server-command')
         
-        print(f"""
+        out.append(f"""
   {{
     "mcpServers": {{
       "{server.get('name', 'server').split('/')[-1]}": {{
@@ -273,16 +442,16 @@ def example_5_installation_info(client: MCPRegistryClient, server_name: str):
         
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
-            print(f"\n❌ Server '{server_name}' not found")
+            out.append(f"\n❌ Server '{server_name}' not found")
         else:
             raise
 
 
 def main():
     """Main function demonstrating registry consumption."""
-    print("="*70)
+    print(_HR)
     print("MCP Registry Consumer - Example Usage")
-    print("="*70)
+    print(_HR)
     print("\nThis script demonstrates how to discover and consume MCP servers")
     print("from the registry using the REST API.")
     
@@ -290,42 +459,55 @@ def main():
     registry_url = "http://localhost:8080"
     print(f"\nRegistry URL: {registry_url}")
     
-    client = MCPRegistryClient(registry_url)
-    
-    # Check registry connectivity
-    try:
-        response = requests.get(f"{registry_url}/health")
-        print(f"✓ Registry is accessible")
-    except Exception as e:
-        print(f"❌ Cannot connect to registry: {e}")
-        print("\nMake sure the registry is running:")
-        print("  cd registry && make docker-up")
-        return
-    
-    # Example server to work with
-    server_name = "io.modelcontextprotocol.anonymous/mcp-math-server"
-    
-    # Run examples
-    try:
-        example_1_search_servers(client)
-        example_2_get_specific_server(client, server_name)
-        example_3_list_versions(client, server_name)
-        example_4_list_all_servers(client)
-        example_5_installation_info(client, server_name)
+    with MCPRegistryClient(registry_url) as client:
+        # Check registry connectivity
+        try:
+            client.health()
+            print(f"✓ Registry is accessible")
+        except Exception as e:
+            print(f"❌ Cannot connect to registry: {e}")
+            print("\nMake sure the registry is running:")
+            print("  cd registry && make docker-up")
+            return
+        
+        # Example server to work with
+        server_name = "io.modelcontextprotocol.anonymous/mcp-math-server"
+        
+        # Run examples
+        try:
+            examples = [
+                (example_1_search_servers, ()),
+                (example_2_get_specific_server, (server_name,)),
+                (example_3_list_versions, (server_name,)),
+                (example_4_list_all_servers, ()),
+                (example_5_installation_info, (server_name,)),
+            ]
+            # The examples are independent, so run them concurrently and
+            # write each one's output in order as it completes
+            with ThreadPoolExecutor(max_workers=len(examples)) as pool:
+                runs = []
+                for example, args in examples:
+                    out: List[str] = []
+                    runs.append((out, pool.submit(example, client, *args, out)))
+                for out, future in runs:
+                    try:
+                        future.result()
+                    finally:
+                        _write(out)
         
-        print("\n" + "="*70)
-        print("✓ All examples completed successfully!")
-        print("="*70)
-        print("\nNext Steps:")
-        print("  • Use these patterns in your MCP client or subregistry")
-        print("  • Add caching to handle registry downtime")
-        print("  • Implement error handling for production use")
-        print("  • See API docs: http://localhost:8080/docs")
+            print("\n" + _HR)
+            print("✓ All examples completed successfully!")
+            print(_HR)
+            print("\nNext Steps:")
+            print("  • Use these patterns in your MCP client or subregistry")
+            print("  • Add caching to handle registry downtime")
+            print("  • Implement error handling for production use")
+            print("  • See API docs: http://localhost:8080/docs")
         
-    except Exception as e:
-        print(f"\n❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
+        except Exception as e:
+            print(f"\n❌ Error: {e}")
+            import traceback
+            traceback.print_exc()
 
 
 if __name__ == "__main__":
@@ -1,35 +1,181 @@
 #!/usr/bin/env python3
 """Publish MCP Server to the registry using REST API."""
 
+import functools
+import hashlib
 import json
 import os
 import sys
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    orjson = None
 
-def get_auth_token_none(registry_url: str) -> str:
+_HR = "=" * 70
+_OFFICIAL_META = "io.modelcontextprotocol.registry/official"
+
+SCHEMA_URL = "https://static.modelcontextprotocol.io/schemas/2025-09-29/server.schema.json"
+
+# Only official MCP server schemas are accepted from a server.json's $schema
+_OFFICIAL_SCHEMA_HOST = "static.modelcontextprotocol.io"
+_OFFICIAL_SCHEMA_PREFIX = "/schemas/"
+
+# Downloaded schemas are kept on disk so repeated runs skip the download
+_SCHEMA_CACHE_DIR = Path(tempfile.gettempdir()) / "mcp_schema_cache"
+_SCHEMA_CACHE_TTL = 24 * 60 * 60
+
+# Headers for registry API calls that send a JSON body
+_API_HEADERS = {
+    "Accept": "application/json, application/problem+json",
+    "Content-Type": "application/json",
+}
+
+# Compiled schema validators, keyed by schema URL
+_VALIDATOR_CACHE: dict = {}
+
+
+def _loads(data: bytes) -> Any:
+    """Decode a JSON response body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(data: Any) -> bytes:
+    """Encode a JSON request body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def _dumps_pretty(data: Any) -> str:
+    """Encode data as indented JSON for display."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2)
+
+
+def make_session() -> requests.Session:
+    """Create an HTTP session with pooled keep-alive connections and retries."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=3, backoff_factor=0.25, status_forcelist=[502, 503, 504]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return session
+
+
+def _api_headers(auth_token: Optional[str] = None) -> dict:
+    """Get request headers for a registry API call."""
+    if not auth_token:
+        return _API_HEADERS
+    return {**_API_HEADERS, "Authorization": f"Bearer {auth_token}"}
+
+
+def check_registry(session: requests.Session, registry_url: str) -> None:
+    """Check that the registry is reachable via its /health endpoint."""
+    response = session.head(f"{registry_url}/health", timeout=2)
+    if response.status_code == 405:
+        # HEAD not routed for this endpoint; fall back to GET
+        response = session.get(f"{registry_url}/health", timeout=2)
+    response.raise_for_status()
+
+
+def get_auth_token_none(session: requests.Session, registry_url: str) -> str:
     """Get authentication token from /auth/none endpoint (for local development)."""
-    response = requests.post(
+    response = session.post(
         f"{registry_url}/v0.1/auth/none",
-        headers={
-            "Accept": "application/json, application/problem+json",
-            "Content-Type": "application/json"
-        },
+        headers=_API_HEADERS,
         timeout=10
     )
     response.raise_for_status()
     
-    data = response.json()
+    data = _loads(response.content)
     token = data['registry_token']
     expires_at = data.get('expires_at', 'unknown')
     print(f"[OK] Got auth token from /auth/none (expires: {expires_at})")
     return token
 
 
+def _is_official_schema_url(schema_url: str) -> bool:
+    """Check whether a URL names an official MCP server schema."""
+    parts = urlsplit(schema_url)
+    if (parts.scheme != "https" or parts.netloc != _OFFICIAL_SCHEMA_HOST
+            or not parts.path.startswith(_OFFICIAL_SCHEMA_PREFIX)
+            or parts.query or parts.fragment):
+        return False
+    tail = parts.path[len(_OFFICIAL_SCHEMA_PREFIX):].split("/")
+    return all(tail) and ".." not in tail and tail[-1] == "server.schema.json"
+
+
+@functools.lru_cache(maxsize=8)
+def _load_schema_cached(schema_url: str, day: str) -> dict:
+    """Load a schema from the disk cache, downloading it if missing or stale.
+
+    ``day`` is only part of the cache key so in-process entries expire daily.
+    """
+    cache_file = _SCHEMA_CACHE_DIR / f"{hashlib.sha256(schema_url.encode()).hexdigest()}.json"
+    try:
+        if cache_file.stat().st_mtime > time.time() - _SCHEMA_CACHE_TTL:
+            with open(cache_file) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    response = requests.get(schema_url, timeout=10)
+    response.raise_for_status()
+    schema = _loads(response.content)
+
+    # Write atomically so concurrent runs never read a partial file
+    try:
+        _SCHEMA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(schema, f)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+    return schema
+
+
+def load_schema(schema_url: str = SCHEMA_URL) -> dict:
+    """Get the MCP server schema, using the local cache when possible."""
+    return _load_schema_cached(schema_url, date.today().isoformat())
+
+
+def _validator(schema_url: str = SCHEMA_URL):
+    """Get a compiled validator for the schema, building it on first use."""
+    validator = _VALIDATOR_CACHE.get(schema_url)
+    if validator is None:
+        import jsonschema
+
+        schema = load_schema(schema_url)
+        validator_cls = jsonschema.validators.validator_for(schema)
+        validator_cls.check_schema(schema)
+        validator = validator_cls(schema)
+        _VALIDATOR_CACHE[schema_url] = validator
+    return validator
+
+
 def validate_server_json(server_json_path: Path) -> dict:
     """Validate server.json against MCP schema."""
     print("Validating server.json...")
@@ -37,37 +183,33 @@ def validate_server_json(server_json_path: Path) -> dict:
     with open(server_json_path) as f:
         server_data = json.load(f)
 
-    # Download schema
-    schema_url = "https://static.modelcontextprotocol.io/schemas/2025-09-29/server.schema.json"
-    response = requests.get(schema_url, timeout=10)
-    response.raise_for_status()
-    schema = response.json()
+    # Validate against the official MCP schema the file pins, if any (schema
+    # and validator are built once, then reused)
+    schema_url = server_data.get('$schema') or SCHEMA_URL
+    if not isinstance(schema_url, str) or not _is_official_schema_url(schema_url):
+        print(f"WARNING: Ignoring non-MCP $schema {schema_url!r}, using {SCHEMA_URL}")
+        schema_url = SCHEMA_URL
+    errors = list(_validator(schema_url).iter_errors(server_data))
+    if errors:
+        import jsonschema
 
-    # Import jsonschema
-    import jsonschema
-    
-    # Validate
-    jsonschema.validate(instance=server_data, schema=schema)
+        print(f"ERROR: Found {len(errors)} validation error(s):")
+        for error in sorted(errors, key=lambda e: e.json_path):
+            print(f"   - {error.json_path}: {error.message}")
+        raise jsonschema.exceptions.best_match(errors)
     print("[OK] Validation successful!")
     return server_data
 
 
-def publish_server(registry_url: str, server_data: dict, auth_token: Optional[str] = None) -> dict:
+def publish_server(session: requests.Session, registry_url: str, server_data: dict,
+                   auth_token: Optional[str] = None) -> dict:
     """Publish server to registry using REST API."""
     print(f"Publishing to: {registry_url}/v0.1/publish")
     
-    headers = {
-        "Accept": "application/json, application/problem+json",
-        "Content-Type": "application/json"
-    }
-    
-    if auth_token:
-        headers["Authorization"] = f"Bearer {auth_token}"
-    
-    response = requests.post(
+    response = session.post(
         f"{registry_url}/v0.1/publish",
-        headers=headers,
-        json=server_data,
+        headers=_api_headers(auth_token),
+        data=_dumps(server_data),
         timeout=30
     )
     
@@ -75,33 +217,26 @@ def publish_server(registry_url: str, server_data: dict, auth_token: Optional[st
     
     if response.status_code not in [200, 201]:
         print(f"ERROR: Publishing failed with status {response.status_code}")
-        error_data = response.json()
+        error_data = _loads(response.content)
         print("Error details:")
-        print(json.dumps(error_data, indent=2))
+        print(_dumps_pretty(error_data))
         response.raise_for_status()
     
     print("[OK] Successfully published!")
-    return response.json()
+    return _loads(response.content)
 
 
-def update_server_version(registry_url: str, server_name: str, version: str, 
-                         server_data: dict, auth_token: Optional[str] = None) -> dict:
+def update_server_version(session: requests.Session, registry_url: str, server_name: str,
+                          version: str, server_data: dict,
+                          auth_token: Optional[str] = None) -> dict:
     """Update a specific server version using REST API."""
     endpoint = f"{registry_url}/v0.1/servers/{server_name}/versions/{version}"
     print(f"Updating: {endpoint}")
     
-    headers = {
-        "Accept": "application/json, application/problem+json",
-        "Content-Type": "application/json"
-    }
-    
-    if auth_token:
-        headers["Authorization"] = f"Bearer {auth_token}"
-    
-    response = requests.put(
+    response = session.put(
         endpoint,
-        headers=headers,
-        json=server_data,
+        headers=_api_headers(auth_token),
+        data=_dumps(server_data),
         timeout=30
     )
     
@@ -109,32 +244,31 @@ def update_server_version(registry_url: str, server_name: str, version: str,
     
     if response.status_code != 200:
         print(f"ERROR: Update failed with status {response.status_code}")
-        error_data = response.json()
+        error_data = _loads(response.content)
         print("Error details:")
-        print(json.dumps(error_data, indent=2))
+        print(_dumps_pretty(error_data))
         response.raise_for_status()
     
     print("[OK] Successfully updated!")
-    return response.json()
+    return _loads(response.content)
 
 
-def get_server_info(registry_url: str, server_name: str) -> dict:
+def get_server_info(session: requests.Session, registry_url: str, server_name: str) -> dict:
     """Get server information from registry."""
-    response = requests.get(
+    response = session.get(
         f"{registry_url}/v0.1/servers",
         params={"search": server_name},
-        headers={"Accept": "application/json"},
         timeout=10
     )
     response.raise_for_status()
-    return response.json()
+    return _loads(response.content)
 
 
 def main() -> int:
     """Main publish function."""
-    print("=" * 70)
+    print(_HR)
     print("MCP Server Publisher - REST API Mode")
-    print("=" * 70)
+    print(_HR)
     print()
 
     # Get paths
@@ -162,8 +296,16 @@ def main() -> int:
     print(f"   Update Mode: {update_mode}")
     print()
 
-    # Validate server.json
-    server_data = validate_server_json(server_json_path)
+    # One session for the whole flow so every call reuses the same connection
+    session = make_session()
+
+    # Run the connectivity check in the background so the TCP/TLS handshake
+    # overlaps with validation and the connection is pooled for later calls
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        connectivity = pool.submit(check_registry, session, registry_url)
+
+        # Validate server.json
+        server_data = validate_server_json(server_json_path)
     print()
 
     # Show server info
@@ -191,58 +333,78 @@ def main() -> int:
 
     # Check if registry is accessible
     print("Checking registry connectivity...")
-    response = requests.get(f"{registry_url}/v0.1/servers", timeout=5)
-    response.raise_for_status()
+    connectivity.result()
     print("[OK] Registry is accessible")
     print()
 
     # Get authentication token if not provided
     if not auth_token and auto_auth:
         print("Getting authentication token from /auth/none...")
-        auth_token = get_auth_token_none(registry_url)
+        auth_token = get_auth_token_none(session, registry_url)
         print(f"[OK] Using auto-generated token: {auth_token[:20]}...")
         print()
 
     # Publish or update
     if update_mode:
-        print("=" * 70)
+        print(_HR)
         print(f"UPDATE MODE: Updating version {server_version}")
-        print("=" * 70)
+        print(_HR)
         print()
         result = update_server_version(
-            registry_url, server_name, server_version, server_data, auth_token
+            session, registry_url, server_name, server_version, server_data, auth_token
         )
     else:
-        print("=" * 70)
+        print(_HR)
         print("PUBLISH MODE: Publishing new server or version")
-        print("=" * 70)
+        print(_HR)
         print()
-        result = publish_server(registry_url, server_data, auth_token)
+        result = publish_server(session, registry_url, server_data, auth_token)
 
     print()
     
     # Display result
     print("Published Server Details:")
-    print(json.dumps(result, indent=2)[:1000])
+    print(_dumps_pretty(result)[:1000])
     print()
 
     # Verify publication
     print("Verifying publication...")
-    time.sleep(2)
+    # Poll with backoff until the new version shows up instead of a fixed sleep.
+    # The waits add up to 3.1s, longer than the old 2s sleep, so registries
+    # with some read-after-write lag still verify (no sleep after the last GET).
+    visible = False
+    for delay in (0.1, 0.2, 0.4, 0.8, 1.6, 0):
+        server_info = get_server_info(session, registry_url, server_name)
+        # search is a substring match, so check the exact name too
+        visible = any((s.get('server') or {}).get('name') == server_name
+                      and (s.get('server') or {}).get('version') == server_version
+                      for s in server_info.get('servers', []))
+        if visible or not delay:
+            break
+        time.sleep(delay)
     
-    server_info = get_server_info(registry_url, server_name)
-    print("[OK] Server is now visible in registry!")
+    if visible:
+        print("[OK] Server is now visible in registry!")
+    else:
+        print(f"ERROR: Version {server_version} is not visible in the registry")
     print()
     print(f"Available versions:")
     for server in server_info.get('servers', []):
-        srv = server.get('server', {})
-        meta = server.get('_meta', {}).get('io.modelcontextprotocol.registry/official', {})
+        srv = server.get('server') or {}
+        meta = (server.get('_meta') or {}).get(_OFFICIAL_META) or {}
         print(f"   - v{srv.get('version')} (published: {meta.get('publishedAt', 'unknown')})")
 
+    if not visible:
+        print()
+        print(_HR)
+        print("VERIFICATION FAILED")
+        print(_HR)
+        return 1
+
     print()
-    print("=" * 70)
+    print(_HR)
     print("SUCCESS")
-    print("=" * 70)
+    print(_HR)
     print()
     print("Next steps:")
     print(f"  1. View server: {registry_url}/v0.1/servers?search={server_name}")